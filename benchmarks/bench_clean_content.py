@@ -0,0 +1,70 @@
+"""
+Micro-benchmark: clean_content against the original two-pass implementation.
+
+Run from the repository root:
+    python benchmarks/bench_clean_content.py
+"""
+import html
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from main import clean_content
+
+
+def legacy_clean_content(text):
+    """The clean_content implementation this benchmark compares against."""
+    text = html.unescape(text)
+    text = re.sub(r'<e_m\b[^>]*>(.*?)</e_m>', '', text)
+    text = re.sub(r'<e_m\b[^>]*/>', '', text)
+    return text
+
+
+def build_corpus(size=20000, seed=1234):
+    """
+    Build message bodies shaped like a Skype export: mostly plain text,
+    with some HTML entities, edit markers, emoticons and links.
+    """
+    rng = random.Random(seed)
+    words = ["Elden", "Ring", "is", "a", "solid", "game", "lol", "review", "the", "boss", "fight", "was", "hard"]
+    corpus = []
+    for _ in range(size):
+        body = " ".join(rng.choice(words) for _ in range(rng.randint(3, 30)))
+        kind = rng.random()
+        if kind < 0.10:
+            body += f" {rng.randint(0, 10)}/10"
+        elif kind < 0.18:
+            body = body.replace(" a ", " &amp; ") + " &quot;quoted&quot;"
+        elif kind < 0.23:
+            body += f'<e_m ts="{rng.randint(10**9, 2 * 10**9)}" a="live:.cid.{rng.randint(1, 10**6)}" t="61"></e_m>'
+        elif kind < 0.26:
+            body = f'<e_m ts="{rng.randint(10**9, 2 * 10**9)}" a="live:someone"/>' + body
+        elif kind < 0.30:
+            body += ' <ss type="smile">:)</ss>'
+        elif kind < 0.33:
+            body += ' <a href="https://example.com/review">https://example.com/review</a>'
+        corpus.append(body)
+    return corpus
+
+
+def main():
+    corpus = build_corpus()
+    for text in corpus:
+        assert clean_content(text) == legacy_clean_content(text), text
+
+    repeat, number = 5, 10
+    legacy = min(timeit.repeat(lambda: [legacy_clean_content(t) for t in corpus], repeat=repeat, number=number))
+    current = min(timeit.repeat(lambda: [clean_content(t) for t in corpus], repeat=repeat, number=number))
+    per_call = 1e9 / (len(corpus) * number)
+    print(f"{len(corpus)} messages, best of {repeat} x {number} runs")
+    print(f"legacy clean_content:  {legacy * per_call:8.1f} ns/message")
+    print(f"current clean_content: {current * per_call:8.1f} ns/message")
+    print(f"speedup:               {legacy / current:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
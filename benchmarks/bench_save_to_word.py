@@ -0,0 +1,67 @@
+"""
+Benchmark: building the Word document with FastDocumentBuilder against the
+original python-docx add_heading/add_paragraph loop.
+
+Run from the repository root:
+    python benchmarks/bench_save_to_word.py [number of messages]
+"""
+import io
+import os
+import sys
+import time
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from docx import Document
+
+from main import FastDocumentBuilder
+from bench_clean_content import build_corpus
+
+
+def legacy_build(messages, username):
+    """The document loop save_to_word used before FastDocumentBuilder."""
+    doc = Document()
+    doc.add_heading(f"Reviews by {username}", level=1)
+    for i, msg in enumerate(messages, start=1):
+        doc.add_heading(f"Review #{i} - {msg['date']}", level=2)
+        doc.add_paragraph("Message content:")
+        doc.add_paragraph(msg["content"])
+        doc.add_paragraph("-" * 40)
+    return doc
+
+
+def fast_build(messages, username):
+    builder = FastDocumentBuilder(username)
+    for i, msg in enumerate(messages, start=1):
+        builder.add_message(i, msg["date"], msg["content"])
+    return builder.document
+
+
+def document_xml(doc):
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return zipfile.ZipFile(buffer).read("word/document.xml")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    messages = [{"date": "March 19, 2025 09:15:44 PM", "content": text} for text in build_corpus(count)]
+
+    start = time.perf_counter()
+    legacy = legacy_build(messages, "someone")
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fast = fast_build(messages, "someone")
+    fast_time = time.perf_counter() - start
+
+    assert document_xml(legacy) == document_xml(fast)
+    print(f"{count} messages (document built in memory, save excluded)")
+    print(f"python-docx loop:    {legacy_time:8.3f} s")
+    print(f"FastDocumentBuilder: {fast_time:8.3f} s")
+    print(f"speedup:             {legacy_time / fast_time:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
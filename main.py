@@ -1,25 +1,376 @@
+import argparse
+import bisect
+from array import array
+import codecs
+import collections
+import contextlib
+import copy
+import csv
+import heapq
 import json
 import html
+import itertools
+import mmap
 import re
 import os
+import signal
+import sqlite3
+import statistics
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+import docx
 from docx import Document
-from datetime import datetime
+from datetime import datetime, timedelta
+from xml.sax.saxutils import escape as xml_escape
 
-def load_conversation(json_file):
-    """Load the Skype conversation JSON file."""
-    with open(json_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+try:
+    import orjson
+except ImportError:  # Optional: only speeds up loading whole exports.
+    orjson = None
+
+try:
+    import ahocorasick
+except ImportError:  # Optional: a C automaton for the keywords search.
+    ahocorasick = None
+
+try:
+    import regex
+except ImportError:  # Optional: gives the regex search a built-in timeout.
+    regex = None
+
+STREAM_CHUNK_SIZE = 1 << 20  # Characters read from the export per refill.
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_JSON_DECODER = json.JSONDecoder()
+
+# The only message fields the filters read ("id" also names conversations and
+# drives incremental mode); projected loads drop everything else.
+MESSAGE_FIELDS = frozenset({"id", "from", "content", "originalarrivaltime", "messagetype"})
+_PROJECTED_KEYS = MESSAGE_FIELDS | {"conversations", "MessageList"}
+
+
+def _project_object(pairs):
+    """object_pairs_hook keeping only the keys a projected load needs."""
+    return {key: value for key, value in pairs if key in _PROJECTED_KEYS}
+
+
+_PROJECTED_DECODER = json.JSONDecoder(object_pairs_hook=_project_object)
+
+
+class ExportReadError(ValueError):
+    """Raised when a streamed export turns out to be malformed while it is being read."""
+
+
+class _JsonStream:
+    """
+    Incremental reader over a JSON text file.
+
+    Objects and arrays are walked by hand so that their members can be
+    consumed one at a time; leaf values (and anything the caller does not
+    want to walk) are decoded with `decoder` once fully buffered.
+    """
+
+    def __init__(self, f, chunk_size=STREAM_CHUNK_SIZE, decoder=_JSON_DECODER):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = decoder
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        """Append the next chunk to the buffer, dropping what was consumed."""
+        if self.eof:
+            return False
+        # Grow geometrically so a value larger than one chunk is not re-decoded too often.
+        try:
+            chunk = self.f.read(max(self.chunk_size, len(self.buf) - self.pos))
+        except UnicodeDecodeError as e:
+            raise ExportReadError(f"Invalid UTF-8 in JSON input: {e}") from None
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ExportReadError("Unexpected end of JSON input")
+
+    def expect(self, char):
+        """Consume `char`, raising ExportReadError if something else comes next."""
+        found = self.peek()
+        if found != char:
+            raise ExportReadError(f"Expected {char!r} but found {found!r} in JSON input")
+        self.pos += 1
+
+    def value(self):
+        """Decode and return the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if not self._fill():
+                    raise ExportReadError(str(e)) from None
+                continue
+            # A number ending exactly at the buffer edge may continue in the next chunk.
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def members(self):
+        """
+        Walk the object at the cursor, yielding each key.
+        The caller must consume the member's value before asking for the next key.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("}")
+            return
+
+    def elements(self):
+        """
+        Walk the array at the cursor, yielding once per element.
+        The caller must consume each element before asking for the next one.
+        """
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
+
+    def values(self):
+        """Yield the decoded elements of the array at the cursor one by one."""
+        for _ in self.elements():
+            yield self.value()
+
+
+def _stream_conversation(stream, project=False):
+    """
+    Parse one conversation object, yielding it as a dict.
+
+    When the conversation id precedes "MessageList" (the usual export layout),
+    the dict is yielded with a lazy "MessageList" iterator so that only one
+    message is held at a time. Otherwise the message list has to be buffered
+    until the id is known, bounding memory by that one conversation.
+    With project=True only the id and the message list are kept.
+    """
+    convo = {}
+    yielded = False
+    for key in stream.members():
+        if key == "MessageList" and "id" in convo:
+            messages = stream.values()
+            convo[key] = messages
+            yield convo
+            # Skip whatever the consumer did not read before moving on.
+            for _ in messages:
+                pass
+            yielded = True
+        elif key == "MessageList":
+            convo[key] = list(stream.values())
+        else:
+            value = stream.value()
+            if not project or key in _PROJECTED_KEYS:
+                convo[key] = value
+    if not yielded:
+        yield convo
+
+
+class _MappedTextReader:
+    """
+    Read-only text file over a memory-mapped UTF-8 export.
+
+    `read(size)` decodes the next `size` bytes straight from the mapping, so
+    the raw file is never copied into Python bytes objects. Pages are loaded
+    lazily by the OS and, where madvise is available, dropped from the
+    process again once they have been decoded, so the mapping does not add
+    the whole file to the resident set.
+    """
+
+    def __init__(self, json_file):
+        self._file = open(json_file, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped; they simply read as "".
+            self._map = None
+        self._view = memoryview(self._map) if self._map is not None else memoryview(b"")
+        self._pos = 0
+        self._released = 0
+        if self._map is not None and hasattr(mmap, "MADV_SEQUENTIAL"):
+            self._map.madvise(mmap.MADV_SEQUENTIAL)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def read(self, size=-1):
+        end = len(self._view) if size is None or size < 0 else min(self._pos + size, len(self._view))
+        with self._view[self._pos:end] as chunk:
+            self._pos = end
+            text = self._decoder.decode(chunk, final=end == len(self._view))
+        self._release_consumed()
+        return text
+
+    def _release_consumed(self):
+        """Let go of the whole pages before the read position."""
+        if self._map is None or not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        end = self._pos - self._pos % mmap.PAGESIZE
+        if end > self._released:
+            self._map.madvise(mmap.MADV_DONTNEED, self._released, end - self._released)
+            self._released = end
+
+    @property
+    def buffer(self):
+        """The whole mapped file as a read-only memoryview."""
+        return self._view
+
+    def close(self):
+        self._view.release()
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _iter_stream_conversations(f, project=False):
+    with f:
+        stream = _JsonStream(f, decoder=_PROJECTED_DECODER if project else _JSON_DECODER)
+        for key in stream.members():
+            if key != "conversations":
+                stream.value()
+                continue
+            for _ in stream.elements():
+                yield from _stream_conversation(stream, project)
+
+
+def _open_export(json_file, use_mmap=False):
+    """Open the export as text, through a memory map if `use_mmap` is set."""
+    if use_mmap:
+        return _MappedTextReader(json_file)
+    return open(json_file, 'r', encoding='utf-8')
+
+
+def stream_conversations(json_file, use_mmap=False, project=False):
+    """
+    Iterate over the conversations of a Skype export without loading the whole file.
+
+    Each conversation is yielded as a dict shaped like the ones produced by
+    `load_conversation`, except that "MessageList" may be a one-shot iterator
+    which must be consumed before advancing to the next conversation.
+    A malformed export raises ExportReadError while it is being iterated.
+    With use_mmap=True the file is memory-mapped and decoded chunk by chunk.
+    project=True keeps only MESSAGE_FIELDS of each message (see `load_conversation`).
+    """
+    f = _open_export(json_file, use_mmap)
+    return _iter_stream_conversations(f, project)
+
+
+JSON_BACKENDS = ("auto", "orjson", "json")
+
+
+def parse_export(raw, backend="auto", project=False):
+    """
+    Parse a whole export given as UTF-8 bytes (or any bytes-like object).
+
+    backend="auto" uses orjson when it is installed and the stdlib json module
+    otherwise. orjson rejects a few inputs json accepts (NaN, integers beyond
+    64 bits, lone surrogate escapes); those are re-parsed with json so the
+    result never depends on the backend. Returns (data, backend used).
+
+    project=True always uses json, whose decoder hook drops unused fields as
+    each object is decoded; orjson offers no such hook.
+    """
+    if backend not in JSON_BACKENDS:
+        raise ValueError(f"Unknown JSON backend: {backend}")
+    if backend == "orjson" and (orjson is None or project):
+        raise ValueError("The orjson backend is not installed." if orjson is None
+                         else "The orjson backend cannot project fields.")
+    if backend != "json" and orjson is not None and not project:
+        try:
+            return orjson.loads(raw), "orjson"
+        except orjson.JSONDecodeError:
+            pass
+    if project:
+        return json.loads(str(raw, 'utf-8'), object_pairs_hook=_project_object), "json (projected)"
+    return json.loads(str(raw, 'utf-8')), "json"
+
+
+def load_conversation(json_file, stream=False, use_mmap=False, backend="auto", project=False):
+    """
+    Load the Skype conversation JSON file.
+
+    The whole file is parsed with `parse_export` using `backend`, and the
+    backend used and the parse time are printed.
+
+    With stream=True the export is parsed incrementally instead: the returned
+    data only holds a lazy "conversations" iterator (see `stream_conversations`),
+    which can be scanned once by `filter_messages`.
+
+    With use_mmap=True the file is memory-mapped and the parser is fed from the
+    mapping, skipping the raw bytes copy.
+
+    With project=True every object keeps only MESSAGE_FIELDS plus the
+    "conversations" and "MessageList" containers, so messages carry just what
+    the filters read and conversations just their id and messages. The other
+    fields are discarded by the decoder as soon as each object is parsed,
+    which makes loading faster and the loaded data much smaller.
+    """
+    if stream:
+        return {"conversations": stream_conversations(json_file, use_mmap, project)}
+    start = time.perf_counter()
+    if use_mmap:
+        with _MappedTextReader(json_file) as f:
+            data, used = parse_export(f.buffer, backend, project)
+    else:
+        with open(json_file, 'rb') as f:
+            data, used = parse_export(f.read(), backend, project)
+    print(f"Parsed {json_file} with {used} in {time.perf_counter() - start:.2f} s")
     return data
 
+# Paired <e_m ...></e_m> and self-closing <e_m .../> tags, stripped in one pass.
+_E_M_TAG = re.compile(r'<e_m\b[^>]*>(.*?)</e_m>|<e_m\b[^>]*/>')
+
 def clean_content(text):
     """
     Clean the message content by:
     1. Unescaping HTML entities.
-    2. Removing XML/HTML tags like <e_m ...></e_m>.
+    2. Removing XML/HTML tags like <e_m ...></e_m> and <e_m .../>.
+
+    Text without '&' or '<' (most messages) is returned untouched.
     """
-    text = html.unescape(text)
-    text = re.sub(r'<e_m\b[^>]*>(.*?)</e_m>', '', text)
-    text = re.sub(r'<e_m\b[^>]*/>', '', text)
+    if "&" in text:
+        text = html.unescape(text)
+    if "<e_m" in text:
+        text = _E_M_TAG.sub('', text)
     return text
 
 def format_date(iso_date):
@@ -35,104 +386,1645 @@ def format_date(iso_date):
     except Exception:
         return iso_date
 
-def filter_messages(data, username, first_word=None, conversation_id=None, search_method="first_word"):
+# Filter stages in evaluation order, with the labels used when reporting how
+# many messages each of them rejected. Cheap predicates run before any content work.
+FILTER_STAGES = [
+    ("conversation", "Rejected by conversation"),
+    ("seen", "Skipped as already processed"),
+    ("sender", "Rejected by sender"),
+    ("date", "Rejected by date range"),
+    ("empty", "Rejected as empty"),
+    ("match", "Rejected by search method"),
+]
+
+def parse_arrival_time(iso_date):
+    """Parse a message's originalarrivaltime, returning None if it is invalid."""
+    try:
+        return datetime.fromisoformat(iso_date.rstrip("Z"))  # Remove 'Z' if present and parse
+    except ValueError:
+        return None
+
+class TimestampParser:
     """
-    Filter messages from the Skype conversation data and sort them by date (oldest to newest).
+    Per-run parser for originalarrivaltime strings.
+
+    The last string parsed is remembered, so the select and format stages
+    share a single parse per message. Timestamps in the usual Skype layout
+    ('YYYY-MM-DDTHH:MM:SS.mmmZ') are formatted from a per-minute cache that
+    only splices in the seconds; anything else goes through `format_date`.
+
+    `known` optionally maps strings already parsed elsewhere (by the parent
+    process of a parallel run) to their datetimes, which are then reused.
     """
-    filtered = []
-    conversations = data.get("conversations", [])
-    
-    for convo in conversations:
+
+    def __init__(self, known=None):
+        self._last_iso = None
+        self._last_dt = None
+        self._minutes = {}
+        self._known = known or {}
+
+    def parse(self, iso_date):
+        """Return the datetime for `iso_date`, or None if it is invalid."""
+        if iso_date is not self._last_iso:
+            known = self._known
+            if known and iso_date in known:
+                self._last_dt = known[iso_date]
+            else:
+                self._last_dt = parse_arrival_time(iso_date)
+            self._last_iso = iso_date
+        return self._last_dt
+
+    def parsed(self, iso_date):
+        """Return (True, datetime) if `iso_date` is the string parsed last, else (False, None)."""
+        if iso_date is self._last_iso:
+            return True, self._last_dt
+        return False, None
+
+    def format(self, iso_date, dt):
+        """Return `format_date(iso_date)`, given the already parsed `dt`."""
+        if dt is None or len(iso_date) != 24 or iso_date[19] != "." or iso_date[23] != "Z":
+            return format_date(iso_date)
+        minute = iso_date[:16]
+        parts = self._minutes.get(minute)
+        if parts is None:
+            parts = self._minutes[minute] = (dt.strftime("%B %d, %Y %I:%M:"), dt.strftime(" %p"))
+        return parts[0] + iso_date[17:19] + parts[1]
+
+def _skip_conversation(messages, stats):
+    """
+    Count the messages of a conversation excluded by its id. A list is just
+    measured; a streamed message iterator has to be drained to count it.
+    """
+    skipped = len(messages) if isinstance(messages, list) else sum(1 for _ in messages)
+    stats["scanned"] += skipped
+    stats["conversation"] += skipped
+
+def iter_messages(data, conversation_id=None, stats=None):
+    """
+    Source stage: yield the raw messages of the selected conversations in export order.
+    """
+    if stats is None:
+        stats = collections.Counter()
+    for convo in data.get("conversations", []):
+        messages = convo.get("MessageList", [])
         if conversation_id and convo.get("id") != conversation_id:
+            _skip_conversation(messages, stats)
             continue
+        for message in messages:
+            stats["scanned"] += 1
+            yield message
+
+def in_date_range(dt, since=None, until=None):
+    """Return True if `dt` lies in [since, until); invalid dates (None) never do."""
+    return dt is not None and (since is None or dt >= since) and (until is None or dt < until)
+
+def first_word_set(first_word):
+    """
+    Normalise the `first_word` argument, which may be a single word or a
+    collection of words, into a set. Empty words never match.
+    """
+    if isinstance(first_word, str):
+        first_word = [first_word]
+    return {word for word in first_word or () if word}
+
+def message_sender(message):
+    """Return the sender of a message without its "8:"-style prefix."""
+    sender = message.get("from", "")
+    if ":" in sender:
+        sender = sender.split(":", 1)[1]
+    return sender
+
+def select_messages(messages, username, since=None, until=None, stats=None, timestamps=None):
+    """
+    Select stage: yield the messages sent by `username` (by anyone if None)
+    whose arrival time lies in [since, until). Only metadata is looked at here,
+    so everything this stage rejects never reaches the content work.
+    """
+    if stats is None:
+        stats = collections.Counter()
+    if timestamps is None:
+        timestamps = TimestampParser()
+    check_date = since is not None or until is not None
+    for message in messages:
+        if username is not None and message_sender(message) != username:
+            stats["sender"] += 1
+            continue
+
+        if check_date:
+            if not in_date_range(timestamps.parse(message.get("originalarrivaltime", "Unknown Date")), since, until):
+                stats["date"] += 1
+                continue
+        yield message
+
+def clean_messages(messages, stats=None):
+    """
+    Clean stage: yield (message, content, words) for every message
+    whose cleaned content is not empty.
+    """
+    if stats is None:
+        stats = collections.Counter()
+    for message in messages:
+        content = message.get("content", "")
+        content = clean_content(content)
+        words = content.strip().split()
+        if not words:
+            stats["empty"] += 1
+            continue
+        yield message, content, words
+
+MATCH_BATCH_SIZE = 4096  # Message bodies handed to a batch matcher at a time.
+
+# Search method name -> factory(first_word, stats) returning that method's matcher.
+SEARCH_METHODS = {}
+
+def register_search_method(name):
+    """
+    Decorator registering a matcher factory as search method `name`.
+
+    The factory is called once per search with the `first_word` argument
+    (the search terms of methods that take any) and the stage counters, in
+    which it may record events of its own, and returns a predicate
+    (content, words) -> bool over the cleaned content and its words. The
+    predicate may also carry a `batch` attribute: a function taking a list
+    of contents and returning the indices of the matching ones, which
+    `match_messages` then uses instead, MATCH_BATCH_SIZE bodies at a time.
+    A `guard` attribute, if present, is a context manager factory entered
+    around the whole scan (see `matcher_guard`).
+    """
+    def register(factory):
+        SEARCH_METHODS[name] = factory
+        return factory
+    return register
+
+def matcher_guard(matcher):
+    """Return the context the scan with `matcher` has to run in."""
+    guard = getattr(matcher, "guard", None)
+    return guard() if guard is not None else contextlib.nullcontext()
+
+def make_matcher(search_method, first_word=None, stats=None):
+    """
+    Compile `search_method` (see SEARCH_METHODS) for `first_word` into its
+    matcher. Raises ValueError for unknown methods or invalid search terms.
+    """
+    if stats is None:
+        stats = collections.Counter()
+    try:
+        factory = SEARCH_METHODS[search_method]
+    except KeyError:
+        raise ValueError(f"Unknown search method: {search_method}") from None
+    return factory(first_word, stats)
+
+@register_search_method("first_word")
+def _first_word_matcher(first_word, stats):
+    """Match messages whose first word is `first_word` (one word or several)."""
+    first_words = first_word_set(first_word)
+    return lambda content, words: words[0] in first_words
+
+REVIEW_PATTERN = re.compile(r'\b\d+(\.\d+)?/10\b')
+
+def review_matches(contents):
+    """
+    Return the indices of the `contents` that contain a review score, in order.
+
+    The bodies are joined with newlines into one buffer, which is scanned
+    for the literal "/10" every score contains; offsets are mapped back to
+    bodies with bisect, and only bodies holding "/10" are checked with
+    REVIEW_PATTERN. A newline is a word boundary, so this gives exactly the
+    result of searching each body separately.
+    """
+    starts = []
+    offset = 0
+    for content in contents:
+        starts.append(offset)
+        offset += len(content) + 1
+    buffer = "\n".join(contents)
+    hits = []
+    find = buffer.find
+    search = REVIEW_PATTERN.search
+    pos = 0
+    while True:
+        found = find("/10", pos)
+        if found < 0:
+            return hits
+        index = bisect.bisect_right(starts, found) - 1
+        start = starts[index]
+        end = start + len(contents[index])
+        if search(buffer, start, end) is not None:
+            hits.append(index)
+        pos = end + 1
+
+@register_search_method("review")
+def _review_matcher(first_word, stats):
+    """Match messages containing a review score such as "8/10"; matched in batches."""
+    def match(content, words):
+        return REVIEW_PATTERN.search(content) is not None
+    match.batch = review_matches
+    return match
+
+def review_scores(content):
+    """Return the scores out of 10 of every review score in `content`, as floats."""
+    return [float(match.group()[:-3]) for match in REVIEW_PATTERN.finditer(content)]
+
+def _is_word_char(char):
+    return char.isalnum() or char == "_"
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over a set of keywords, built once per search.
+
+    Keywords are matched case-insensitively as whole words (a hit must not
+    start or end inside a word of the text), and the scan is
+    linear in the length of the text whatever the number of keywords. The
+    automaton comes from pyahocorasick when it is installed; otherwise an
+    equivalent pure-Python one is used.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = sorted({keyword.strip().lower() for keyword in keywords
+                                if keyword.strip() and "\n" not in keyword})
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for keyword in self.keywords:
+                self._automaton.add_word(keyword, len(keyword))
+            if self.keywords:
+                self._automaton.make_automaton()
+            return
+        # Trie transitions, failure links and, per state, the lengths of the
+        # keywords ending there (including those reached via failure links).
+        self._goto = [{}]
+        self._out = [[]]
+        for keyword in self.keywords:
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = self._goto[state][char] = len(self._goto)
+                    self._goto.append({})
+                    self._out.append([])
+                state = next_state
+            self._out[state].append(len(keyword))
+        self._fail = [0] * len(self._goto)
+        queue = collections.deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._out[next_state] += self._out[self._fail[next_state]]
+
+    def _iter_hits(self, text):
+        """Yield (start, end) of every keyword occurrence in `text`, by end offset."""
+        if not self.keywords:
+            return
+        if ahocorasick is not None:
+            for last, length in self._automaton.iter(text):
+                yield last + 1 - length, last + 1
+            return
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for end in range(1, len(text) + 1):
+            char = text[end - 1]
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length in out[state]:
+                yield end - length, end
+
+    @staticmethod
+    def _whole_word(text, start, end):
+        """Return True unless text[start:end] begins or ends inside a word."""
+        if start > 0 and _is_word_char(text[start - 1]) and _is_word_char(text[start]):
+            return False
+        return not (end < len(text) and _is_word_char(text[end]) and _is_word_char(text[end - 1]))
+
+    def search(self, text):
+        """Return True if the lower-cased `text` contains a keyword as a whole word."""
+        return any(self._whole_word(text, start, end) for start, end in self._iter_hits(text))
+
+    def matches(self, contents):
+        """
+        Return the indices of the `contents` containing a keyword, in order.
+        The lower-cased bodies are joined with newlines, which no keyword
+        contains, and scanned in a single pass.
+        """
+        lowered = [content.lower() for content in contents]
+        starts = []
+        offset = 0
+        for content in lowered:
+            starts.append(offset)
+            offset += len(content) + 1
+        buffer = "\n".join(lowered)
+        hits = []
+        next_start = 0  # Hits before this offset are in bodies that already matched.
+        for start, end in self._iter_hits(buffer):
+            if start < next_start or not self._whole_word(buffer, start, end):
+                continue
+            index = bisect.bisect_right(starts, start) - 1
+            hits.append(index)
+            next_start = starts[index] + len(lowered[index]) + 1
+        return hits
+
+@register_search_method("keywords")
+def _keywords_matcher(first_word, stats):
+    """
+    Match messages containing any of the keywords in `first_word` (one or
+    many, e.g. game titles) as whole words, ignoring case.
+    """
+    automaton = KeywordAutomaton(first_word_set(first_word))
+    def match(content, words):
+        return automaton.search(content.lower())
+    match.batch = automaton.matches
+    return match
+
+REGEX_TIMEOUT = 0.5  # Seconds a regex search may spend on one message.
+
+class _RegexTimeout(Exception):
+    pass
+
+def _raise_regex_timeout(signum, frame):
+    raise _RegexTimeout()
+
+def compile_patterns(patterns):
+    """
+    Compile the regex search `patterns`, with the regex module when it is
+    installed. Raises ValueError for an invalid pattern.
+    """
+    compile = regex.compile if regex is not None else re.compile
+    errors = (re.error, regex.error) if regex is not None else re.error
+    try:
+        return [compile(pattern) for pattern in patterns]
+    except errors as e:
+        raise ValueError(f"Invalid regular expression: {e}") from None
+
+@register_search_method("regex")
+def _regex_matcher(first_word, stats):
+    """
+    Match messages in which any of the regular expressions in `first_word`
+    is found, compiled once.
+
+    Each message may take REGEX_TIMEOUT seconds, so that a pattern with
+    catastrophic backtracking cannot stall a long run; messages over budget
+    count as not matching and are counted as stats["timeout"]. The regex
+    module's own timeout is used when it is installed. Otherwise the re
+    search is interrupted by a SIGALRM timer, which is only possible on POSIX
+    systems in the main thread; elsewhere the search runs unguarded. The
+    SIGALRM handler is installed by the matcher's guard for the whole scan,
+    so each message only arms and disarms the timer; outside the guard the
+    search runs unguarded too.
+    """
+    patterns = compile_patterns(first_word_set(first_word))
+    if regex is not None:
+        def match(content, words):
+            try:
+                return any(pattern.search(content, timeout=REGEX_TIMEOUT) is not None for pattern in patterns)
+            except TimeoutError:
+                stats["timeout"] += 1
+                return False
+        return match
+    if not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        return lambda content, words: any(pattern.search(content) is not None for pattern in patterns)
+
+    guarded = [False]
+
+    @contextlib.contextmanager
+    def guard():
+        previous = signal.signal(signal.SIGALRM, _raise_regex_timeout)
+        guarded[0] = True
+        try:
+            yield
+        finally:
+            guarded[0] = False
+            signal.signal(signal.SIGALRM, previous)
+
+    setitimer, timer = signal.setitimer, signal.ITIMER_REAL
+
+    def match(content, words):
+        if not guarded[0]:
+            return any(pattern.search(content) is not None for pattern in patterns)
+        try:
+            setitimer(timer, REGEX_TIMEOUT)
+            try:
+                return any(pattern.search(content) is not None for pattern in patterns)
+            finally:
+                setitimer(timer, 0)
+        except _RegexTimeout:
+            stats["timeout"] += 1
+            return False
+    match.guard = guard
+    return match
+
+def _match_batches(cleaned, batch_matcher, stats):
+    """Run `batch_matcher` over MATCH_BATCH_SIZE cleaned messages at a time."""
+    cleaned = iter(cleaned)
+    while True:
+        batch = list(itertools.islice(cleaned, MATCH_BATCH_SIZE))
+        if not batch:
+            return
+        hits = batch_matcher([content for _, content, _ in batch])
+        stats["match"] += len(batch) - len(hits)
+        for index in hits:
+            message, content, _ = batch[index]
+            yield message, content
+
+def match_messages(cleaned, first_word=None, search_method="first_word", stats=None):
+    """
+    Match stage: yield (message, content) for the cleaned messages that
+    satisfy the search method, compiled once by `make_matcher`.
+    `first_word` may be one word or several. Methods with a batch matcher
+    (such as review) work on batches, so their matches come out in bursts.
+    """
+    if stats is None:
+        stats = collections.Counter()
+    matcher = make_matcher(search_method, first_word, stats)
+    batch_matcher = getattr(matcher, "batch", None)
+    if batch_matcher is not None:
+        yield from _match_batches(cleaned, batch_matcher, stats)
+        return
+    with matcher_guard(matcher):
+        for message, content, words in cleaned:
+            if matcher(content, words):
+                yield message, content
+            else:
+                stats["match"] += 1
+
+def format_messages(matches, stats=None, timestamps=None):
+    """
+    Format stage: turn (message, content) pairs into the result dicts
+    consumed by the sinks ("datetime", "date" and "content").
+    """
+    if stats is None:
+        stats = collections.Counter()
+    if timestamps is None:
+        timestamps = TimestampParser()
+    for message, content in matches:
+        iso_date = message.get("originalarrivaltime", "Unknown Date")
+        dt = timestamps.parse(iso_date)
+        stats["matched"] += 1
+        yield {
+            "datetime": dt,
+            "date": timestamps.format(iso_date, dt),
+            "content": content
+        }
+
+def _sort_key(msg):
+    """Sort formatted messages by datetime, handling None dates as well."""
+    return msg["datetime"] if msg["datetime"] else datetime.min
+
+def sort_messages(formatted):
+    """
+    Sort stage: yield the formatted messages by datetime (oldest to newest).
+    Messages without a valid date come first. This stage has to buffer its input.
+    """
+    yield from sorted(formatted, key=_sort_key)
+
+PARALLEL_SHARD_SIZE = 20000  # Messages handed to a worker process at a time.
+
+def _filter_shard(messages, known, first_word, search_method, sort):
+    """
+    Run the clean -> match -> format (-> sort) stages over one shard in a worker.
+    `known` maps the arrival times the parent already parsed to their datetimes.
+    Returns the results together with the worker's stage counters.
+    """
+    stats = collections.Counter()
+    matches = match_messages(clean_messages(messages, stats), first_word, search_method, stats)
+    formatted = format_messages(matches, stats, TimestampParser(known))
+    if sort:
+        return list(sort_messages(formatted)), stats
+    return list(formatted), stats
+
+def _with_parsed_times(selected, timestamps):
+    """
+    Pair each selected message with (arrival time, datetime) if the parent
+    already parsed its arrival time while selecting it, else with None.
+    """
+    for message in selected:
+        iso_date = message.get("originalarrivaltime", "Unknown Date")
+        found, dt = timestamps.parsed(iso_date)
+        yield message, (iso_date, dt) if found else None
+
+def _iter_shard_results(selected, first_word, search_method, sort, workers, stats, timestamps):
+    """
+    Shard the selected messages into contiguous chunks, filter them on a
+    process pool and yield each shard's results in export order.
+    Only a bounded number of shards is in flight at any time. Arrival times
+    the parent parsed are sent along, so workers do not parse them again.
+    """
+    selected = _with_parsed_times(selected, timestamps)
+    pending = collections.deque()
+
+    def collect():
+        results, shard_stats = pending.popleft().result()
+        stats.update(shard_stats)
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            shard = list(itertools.islice(selected, PARALLEL_SHARD_SIZE))
+            if not shard:
+                break
+            messages = [message for message, _ in shard]
+            known = dict(parsed for _, parsed in shard if parsed is not None)
+            pending.append(executor.submit(_filter_shard, messages, known, first_word, search_method, sort))
+            if len(pending) >= workers * 2:
+                yield collect()
+        while pending:
+            yield collect()
+
+def _iter_filtered_parallel(selected, first_word, search_method, sort, workers, stats, timestamps):
+    results = _iter_shard_results(selected, first_word, search_method, sort, workers, stats, timestamps)
+    if sort:
+        # Shards are contiguous and heapq.merge is stable, so ties keep the serial order.
+        yield from heapq.merge(*list(results), key=_sort_key)
+    else:
+        for result in results:
+            yield from result
+
+def iter_filtered_messages(data, username, first_word=None, conversation_id=None,
+                           search_method="first_word", sort=False, workers=1,
+                           since=None, until=None, stats=None):
+    """
+    Lazily filter messages from the Skype conversation data.
+
+    Chains the source -> select -> clean -> match -> format stages so that
+    sinks can consume matches as soon as they are found. The cheap conversation,
+    sender and date range (since inclusive, until exclusive) checks run first;
+    only their survivors are cleaned and matched. Messages are yielded in export
+    order unless sort=True, which adds the (buffering) sort stage.
+
+    With workers > 1 the selected messages are split into shards that are
+    cleaned and matched on a process pool; the per-shard sorted results are
+    k-way merged, giving exactly the same output as the serial path.
+
+    `first_word` may be a single word or a collection of words to accept.
+
+    `data` may also be a MessageIndex (see `open_index`), in which case the
+    conversation, sender and first word are looked up in the index instead of
+    scanning the export; `workers` is then ignored. First-word lookups rely on
+    the (sender, first_word) index of that SQLite database (see `build_index`).
+
+    If a Counter is passed as `stats`, it receives the number of messages
+    scanned, rejected by each of FILTER_STAGES, and matched.
+    """
+    if stats is None:
+        stats = collections.Counter()
+    timestamps = TimestampParser()
+    if isinstance(data, MessageIndex):
+        query_first_word = first_word if search_method == "first_word" else None
+        cleaned = data.iter_cleaned(username, conversation_id, query_first_word, since, until, stats, timestamps)
+        formatted = format_messages(match_messages(cleaned, first_word, search_method, stats), stats, timestamps)
+        return sort_messages(formatted) if sort else formatted
+    messages = iter_messages(data, conversation_id, stats)
+    selected = select_messages(messages, username, since, until, stats, timestamps)
+    return _filter_selected(selected, first_word, search_method, sort, workers, stats, timestamps)
+
+def _filter_selected(selected, first_word, search_method, sort, workers, stats, timestamps):
+    """Run the clean -> match -> format (-> sort) stages, in parallel if workers > 1."""
+    if workers > 1:
+        return _iter_filtered_parallel(selected, first_word, search_method, sort, workers, stats, timestamps)
+    matches = match_messages(clean_messages(selected, stats), first_word, search_method, stats)
+    formatted = format_messages(matches, stats, timestamps)
+    if sort:
+        return sort_messages(formatted)
+    return formatted
+
+def filter_messages(data, username, first_word=None, conversation_id=None, search_method="first_word",
+                    workers=1, since=None, until=None, stats=None):
+    """
+    Filter messages from the Skype conversation data and sort them by date (oldest to newest).
+    """
+    return list(iter_filtered_messages(data, username, first_word, conversation_id, search_method,
+                                       sort=True, workers=workers, since=since, until=until, stats=stats))
+
+def iter_new_messages(data, markers, conversation_id=None, stats=None, timestamps=None):
+    """
+    Source stage for incremental runs: like `iter_messages`, but skips the
+    messages that `markers` records as already processed.
+
+    `markers` maps str(conversation id) to the latest originalarrivaltime seen
+    in that conversation ("last_arrival"), the ids of the messages at that time
+    ("last_ids") and the ids of messages without a valid date ("undated_ids").
+    A message is new if it is later than the marker, or at the same time with
+    an unseen id. Markers are updated in place once a conversation is done.
+    """
+    if stats is None:
+        stats = collections.Counter()
+    if timestamps is None:
+        timestamps = TimestampParser()
+    for convo in data.get("conversations", []):
         messages = convo.get("MessageList", [])
+        if conversation_id and convo.get("id") != conversation_id:
+            _skip_conversation(messages, stats)
+            continue
+
+        key = str(convo.get("id"))
+        marker = markers.get(key, {})
+        last_arrival = marker.get("last_arrival")
+        last_dt = timestamps.parse(last_arrival) if last_arrival else None
+        last_ids = set(marker.get("last_ids", []))
+        undated_ids = set(marker.get("undated_ids", []))
+        new_arrival, new_dt, new_ids = last_arrival, last_dt, set(last_ids)
         for message in messages:
-            sender = message.get("from", "")
-            if ":" in sender:
-                sender = sender.split(":", 1)[1]
-            content = message.get("content", "")
-            content = clean_content(content)
+            stats["scanned"] += 1
+            iso_date = message.get("originalarrivaltime", "Unknown Date")
+            dt = timestamps.parse(iso_date)
+            message_id = message.get("id")
+            if dt is None:
+                if message_id in undated_ids:
+                    stats["seen"] += 1
+                    continue
+                undated_ids.add(message_id)
+            else:
+                if last_dt is not None and (dt < last_dt or (dt == last_dt and message_id in last_ids)):
+                    stats["seen"] += 1
+                    continue
+                if new_dt is None or dt > new_dt:
+                    new_arrival, new_dt, new_ids = iso_date, dt, {message_id}
+                elif dt == new_dt:
+                    new_ids.add(message_id)
+            yield message
+        markers[key] = {
+            "last_arrival": new_arrival,
+            "last_ids": sorted(new_ids, key=str),
+            "undated_ids": sorted(undated_ids, key=str),
+        }
+
+def _load_state(state_file, query):
+    """Load an incremental state file, or return a fresh state for `query`."""
+    if not os.path.exists(state_file):
+        return {"query": query, "conversations": {}, "results": []}
+    with open(state_file, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    if state.get("query") != query:
+        raise ValueError(f"{state_file} was recorded for a different search: {state.get('query')}")
+    return state
+
+def _save_state(state_file, state):
+    """Write the state file atomically."""
+    tmp_file = state_file + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_file, state_file)
+
+def filter_messages_incremental(data, state_file, username, first_word=None, conversation_id=None,
+                                search_method="first_word", workers=1, since=None, until=None, stats=None):
+    """
+    Filter only the messages added since the previous run recorded in
+    `state_file`, and return them merged with that run's results, sorted by
+    date as `filter_messages` does.
+
+    The state file keeps the search parameters, per-conversation markers (see
+    `iter_new_messages`) and the results so far; it is created on the first run
+    and must be used with the same search afterwards. Messages older than a
+    conversation's marker are assumed to have been processed already.
+    """
+    if stats is None:
+        stats = collections.Counter()
+    query = {
+        "username": username,
+        "first_word": sorted(first_word_set(first_word)),
+        "conversation_id": conversation_id,
+        "search_method": search_method,
+        "since": since.isoformat() if since else None,
+        "until": until.isoformat() if until else None,
+    }
+    state = _load_state(state_file, query)
+    timestamps = TimestampParser()
+    messages = iter_new_messages(data, state["conversations"], conversation_id, stats, timestamps)
+    selected = select_messages(messages, username, since, until, stats, timestamps)
+    new_results = list(_filter_selected(selected, first_word, search_method, True, workers, stats, timestamps))
+
+    previous = [{"datetime": datetime.fromisoformat(r["datetime"]) if r["datetime"] else None,
+                 "date": r["date"], "content": r["content"]} for r in state["results"]]
+    results = list(sort_messages(previous + new_results))
+    state["results"] = [{"datetime": r["datetime"].isoformat() if r["datetime"] else None,
+                         "date": r["date"], "content": r["content"]} for r in results]
+    _save_state(state_file, state)
+    return results
+
+def filter_messages_batch(data, jobs, stats=None):
+    """
+    Evaluate several searches in a single pass over the export.
+
+    Each job is a dict with "username" and optionally "search_method"
+    (default "first_word"), "first_word" and "conversation_id", as accepted
+    by `filter_messages`. Returns one sorted result list per job, identical to
+    calling `filter_messages` for each job, but every message is read, cleaned
+    and date-parsed at most once. Indexes are queried once per job instead.
+
+    If a list of Counters (one per job) is passed as `stats`, each receives
+    the events recorded by its job's matcher, such as regex timeouts.
+    """
+    if stats is None:
+        stats = [collections.Counter() for _ in jobs]
+    if isinstance(data, MessageIndex):
+        return [filter_messages(data, job["username"], job.get("first_word"), job.get("conversation_id"),
+                                job.get("search_method", "first_word"), stats=job_stats)
+                for job, job_stats in zip(jobs, stats)]
+
+    matchers = [make_matcher(job.get("search_method", "first_word"), job.get("first_word"), job_stats)
+                for job, job_stats in zip(jobs, stats)]
+    with contextlib.ExitStack() as guards:
+        for matcher in matchers:
+            guards.enter_context(matcher_guard(matcher))
+        results = _scan_batch(data, jobs, matchers)
+    return [list(sort_messages(result)) for result in results]
+
+def _scan_batch(data, jobs, matchers):
+    """The single pass of `filter_messages_batch`: one unsorted result list per job."""
+    results = [[] for _ in jobs]
+    timestamps = TimestampParser()
+    for convo in data.get("conversations", []):
+        convo_id = convo.get("id")
+        # sender -> [(job number, matcher)] for the jobs that apply to this conversation.
+        active = {}
+        for i, job in enumerate(jobs):
+            if not job.get("conversation_id") or job["conversation_id"] == convo_id:
+                active.setdefault(job["username"], []).append((i, matchers[i]))
+        for message in convo.get("MessageList", []):
+            candidates = active.get(message_sender(message))
+            if not candidates:
+                continue
+            content = clean_content(message.get("content", ""))
             words = content.strip().split()
             if not words:
                 continue
+            formatted = None
+            for i, matcher in candidates:
+                if matcher(content, words):
+                    if formatted is None:
+                        formatted = next(format_messages([(message, content)], timestamps=timestamps))
+                    results[i].append(formatted)
+    return results
 
-            if sender != username:
-                continue
+def print_filter_stats(stats):
+    """Print how many messages were scanned, rejected at each stage and matched."""
+    print(f"Messages scanned: {stats['scanned']}")
+    for stage, label in FILTER_STAGES:
+        print(f"{label}: {stats[stage]}")
+    print(f"Matched: {stats['matched']}")
+    if stats["timeout"]:
+        print(f"Search timed out on (counted as not matching): {stats['timeout']}")
 
-            iso_date = message.get("originalarrivaltime", "Unknown Date")
-            try:
-                dt = datetime.fromisoformat(iso_date.rstrip("Z"))  # Remove 'Z' if present and parse
-            except ValueError:
-                dt = None  # If date is invalid, leave as None
-
-            formatted_date = format_date(iso_date)
-            
-            if search_method == "first_word":
-                if first_word and words[0] == first_word:
-                    filtered.append({
-                        "datetime": dt,
-                        "date": formatted_date,
-                        "content": content
-                    })
-            elif search_method == "review":
-                if re.search(r'\b\d+(\.\d+)?/10\b', content):
-                    filtered.append({
-                        "datetime": dt,
-                        "date": formatted_date,
-                        "content": content
-                    })
-
-    # Sort messages by datetime (oldest to newest), handling None dates as well
-    filtered.sort(key=lambda x: x["datetime"] if x["datetime"] else datetime.min)
-    
-    return filtered
 
+_EPOCH = datetime(1970, 1, 1)
+
+class ReviewScores:
+    """
+    Review scores extracted from an export, kept in compact parallel arrays.
+
+    Each score found gives one entry in `scores` (the value out of 10),
+    `times` (the message's arrival time as seconds since 1970 UTC, NaN if
+    invalid), `months` (year * 12 + month - 1, -1 if invalid) and `senders`
+    (an offset into `users`). The aggregate queries only read these arrays,
+    so they never re-scan message content.
+    """
+
+    def __init__(self):
+        self.users = []
+        self._user_ids = {}
+        self.senders = array('I')
+        self.scores = array('d')
+        self.times = array('d')
+        self.months = array('i')
+
+    def __len__(self):
+        return len(self.scores)
+
+    def add(self, username, dt, score):
+        """Record one `score` given by `username` in a message sent at `dt` (None if unknown)."""
+        user_id = self._user_ids.get(username)
+        if user_id is None:
+            user_id = self._user_ids[username] = len(self.users)
+            self.users.append(username)
+        self.senders.append(user_id)
+        self.scores.append(score)
+        if dt is None:
+            self.times.append(float("nan"))
+            self.months.append(-1)
+        else:
+            self.times.append((dt - _EPOCH).total_seconds())
+            self.months.append(dt.year * 12 + dt.month - 1)
+
+    def group(self, by="user", username=None):
+        """
+        Return {label: array of scores}, grouped by "user" or by "month"
+        ('YYYY-MM'; scores without a valid date are left out), optionally
+        only for `username`. Labels come out sorted.
+        """
+        if by not in ("user", "month"):
+            raise ValueError(f"Unknown grouping: {by}")
+        user_id = self._user_ids.get(username) if username is not None else None
+        if username is not None and user_id is None:
+            return {}
+        keys = self.senders if by == "user" else self.months
+        groups = {}
+        for key, sender, score in zip(keys, self.senders, self.scores):
+            if (user_id is None or sender == user_id) and key >= 0:
+                scores = groups.get(key)
+                if scores is None:
+                    scores = groups[key] = array('d')
+                scores.append(score)
+        if by == "user":
+            return {self.users[key]: groups[key] for key in sorted(groups, key=self.users.__getitem__)}
+        return {f"{key // 12:04d}-{key % 12 + 1:02d}": groups[key] for key in sorted(groups)}
+
+    def mean(self, by="user", username=None):
+        """Mean score per group (see `group`)."""
+        return {label: statistics.fmean(scores) for label, scores in self.group(by, username).items()}
+
+    def median(self, by="user", username=None):
+        """Median score per group (see `group`)."""
+        return {label: statistics.median(scores) for label, scores in self.group(by, username).items()}
+
+    def histogram(self, username=None):
+        """Return {whole score: count}, with each score rounded down, sorted by score."""
+        user_id = self._user_ids.get(username) if username is not None else None
+        if username is not None and user_id is None:
+            return {}
+        counts = collections.Counter(int(score) for sender, score in zip(self.senders, self.scores)
+                                     if user_id is None or sender == user_id)
+        return dict(sorted(counts.items()))
+
+    def summary(self, username=None):
+        """Return the count, mean and median per user and per month plus the histogram, as plain data."""
+        def describe(groups):
+            return {label: {"count": len(scores), "mean": statistics.fmean(scores),
+                            "median": statistics.median(scores)} for label, scores in groups.items()}
+        return {
+            "by_user": describe(self.group("user", username)),
+            "by_month": describe(self.group("month", username)),
+            "histogram": {str(score): count for score, count in self.histogram(username).items()},
+        }
+
+def extract_review_scores(data, username=None, conversation_id=None, since=None, until=None, stats=None):
+    """
+    Scan the export once and collect the review scores of `username` (of
+    every sender if None) into a ReviewScores. A message may hold several
+    scores; messages without any are counted as rejected by the search method.
+    """
+    if stats is None:
+        stats = collections.Counter()
+    timestamps = TimestampParser()
+    reviews = ReviewScores()
+    messages = select_messages(iter_messages(data, conversation_id, stats), username, since, until, stats, timestamps)
+    for message, content in _match_batches(clean_messages(messages, stats), review_matches, stats):
+        stats["matched"] += 1
+        sender = message_sender(message)
+        dt = timestamps.parse(message.get("originalarrivaltime", "Unknown Date"))
+        for score in review_scores(content):
+            reviews.add(sender, dt, score)
+    return reviews
+
+
+INDEX_SCHEMA = """
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE messages (
+    seq INTEGER PRIMARY KEY,   -- Position in the export, for stable ordering.
+    conversation_id TEXT,
+    sender TEXT NOT NULL,
+    arrival TEXT,              -- Raw originalarrivaltime.
+    first_word TEXT NOT NULL,
+    content TEXT NOT NULL      -- Cleaned content.
+);
+"""
+
+INDEX_INDEXES = """
+CREATE INDEX messages_sender_first_word ON messages (sender, first_word);
+CREATE INDEX messages_sender_conversation ON messages (sender, conversation_id);
+"""
+
+INDEX_BATCH_SIZE = 10000  # Rows inserted per executemany call while building.
+
+def _source_signature(json_file):
+    """Return the (size, mtime) pair used to detect that an index is stale."""
+    st = os.stat(json_file)
+    return str(st.st_size), str(st.st_mtime_ns)
+
+def build_index(json_file, index_file, use_mmap=False):
+    """
+    Convert a Skype export into an on-disk SQLite message index.
+
+    The export is streamed, so building needs little memory. Every message with
+    non-empty content is stored once with its conversation id, sender, raw
+    arrival time, first word and cleaned content. The index is written to a
+    temporary file first and moved into place when complete. With use_mmap=True
+    the export is read through a memory map.
+    """
+    tmp_file = index_file + ".tmp"
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+    connection = sqlite3.connect(tmp_file)
+    try:
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.executescript(INDEX_SCHEMA)
+        data = load_conversation(json_file, stream=True, use_mmap=use_mmap, project=True)
+        rows = []
+        count = 0
+        for convo in data.get("conversations", []):
+            convo_id = convo.get("id")
+            for message in convo.get("MessageList", []):
+                content = clean_content(message.get("content", ""))
+                words = content.strip().split()
+                if not words:
+                    continue
+                rows.append((convo_id, message_sender(message),
+                             message.get("originalarrivaltime", "Unknown Date"), words[0], content))
+                if len(rows) >= INDEX_BATCH_SIZE:
+                    connection.executemany("INSERT INTO messages (conversation_id, sender, arrival, first_word, content) "
+                                           "VALUES (?, ?, ?, ?, ?)", rows)
+                    count += len(rows)
+                    rows = []
+        connection.executemany("INSERT INTO messages (conversation_id, sender, arrival, first_word, content) "
+                               "VALUES (?, ?, ?, ?, ?)", rows)
+        count += len(rows)
+        connection.executescript(INDEX_INDEXES)
+        size, mtime = _source_signature(json_file)
+        connection.executemany("INSERT INTO meta (key, value) VALUES (?, ?)",
+                               [("source", os.path.abspath(json_file)), ("size", size), ("mtime", mtime)])
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(tmp_file, index_file)
+    print(f"Indexed {count} messages into {index_file}")
+    return count
+
+class MessageIndex:
+    """
+    Read access to a message index built by `build_index`.
+
+    Pass an instance to `filter_messages` / `iter_filtered_messages` in place
+    of the loaded export data.
+    """
+
+    def __init__(self, index_file):
+        self.index_file = index_file
+        self.connection = sqlite3.connect(index_file)
+
+    def close(self):
+        self.connection.close()
+
+    def is_current(self, json_file):
+        """Return True if the index was built from `json_file` as it is now."""
+        meta = dict(self.connection.execute("SELECT key, value FROM meta"))
+        try:
+            return (meta.get("size"), meta.get("mtime")) == _source_signature(json_file)
+        except OSError:
+            return False
+
+    def iter_cleaned(self, username, conversation_id=None, first_word=None,
+                     since=None, until=None, stats=None, timestamps=None):
+        """
+        Yield (message, content, words) for the indexed messages of `username`,
+        in export order, ready for the match stage. "message" only carries the
+        originalarrivaltime. Conversation, sender and first word are filtered
+        by the index, so only date range rejections are counted in `stats`.
+        """
+        if stats is None:
+            stats = collections.Counter()
+        if timestamps is None:
+            timestamps = TimestampParser()
+        query = "SELECT arrival, content FROM messages WHERE sender = ?"
+        params = [username]
+        if conversation_id:
+            query += " AND conversation_id = ?"
+            params.append(conversation_id)
+        if first_word:
+            first_words = sorted(first_word_set(first_word))
+            query += f" AND first_word IN ({', '.join('?' * len(first_words))})"
+            params.extend(first_words)
+        query += " ORDER BY seq"
+
+        check_date = since is not None or until is not None
+        for arrival, content in self.connection.execute(query, params):
+            stats["scanned"] += 1
+            if check_date:
+                if not in_date_range(timestamps.parse(arrival), since, until):
+                    stats["date"] += 1
+                    continue
+            yield {"originalarrivaltime": arrival}, content, content.split()
+
+def open_index(index_file):
+    """Open a message index built by `build_index`."""
+    if not os.path.exists(index_file):
+        raise FileNotFoundError(f"No message index at {index_file}")
+    return MessageIndex(index_file)
+
+def _first_free_name(name, taken):
+    """Return `name`, or the first "<base>_<n><ext>" variant of it, not in the set `taken`."""
+    if name not in taken:
+        return name
+    base, ext = os.path.splitext(name)
+    counter = 1
+    while f"{base}_{counter}{ext}" in taken:
+        counter += 1
+    return f"{base}_{counter}{ext}"
 
 def get_available_filename(filename):
     """
     Check if the file already exists. If it does, append an incrementing number to the filename.
     For example, if "user_messages.docx" exists, it will return "user_messages_1.docx", and so on.
+
+    The chosen name is created empty with an exclusive create, so concurrent
+    runs, processes and threads never get the same name; the caller is expected
+    to overwrite it. The requested name is tried first, and the directory is only
+    listed (once, rather than probed name by name) if it is taken.
     """
-    if not os.path.exists(filename):
-        return filename
-    base, ext = os.path.splitext(filename)
-    counter = 1
-    new_filename = f"{base}_{counter}{ext}"
-    while os.path.exists(new_filename):
-        counter += 1
-        new_filename = f"{base}_{counter}{ext}"
-    return new_filename
+    directory, name = os.path.split(filename)
+    candidate = filename
+    taken = None
+    while True:
+        try:
+            fd = os.open(candidate, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+        except FileExistsError:
+            if taken is None:
+                taken = set(os.listdir(directory or "."))
+            # Also covers names created by someone else since the listing.
+            taken.add(os.path.basename(candidate))
+            candidate = os.path.join(directory, _first_free_name(name, taken))
+            continue
+        os.close(fd)
+        return candidate
+
+@contextlib.contextmanager
+def claim_output_file(filename, claimed=False):
+    """
+    Claim a free name for `filename` with `get_available_filename` and yield it.
+    With claimed=True, `filename` was already claimed by the caller and is
+    yielded as is, to be overwritten.
+    If the body raises, the claimed (empty or partly written) file is removed.
+    """
+    final_output_file = filename if claimed else get_available_filename(filename)
+    try:
+        yield final_output_file
+    except BaseException:
+        try:
+            os.remove(final_output_file)
+        except OSError:
+            pass
+        raise
+
+# Characters lxml (and therefore python-docx) refuses to put in a document.
+_XML_INVALID_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+
+class FastDocumentBuilder:
+    """
+    Build the `save_to_word` layout on a python-docx Document from paragraph
+    templates rendered once by python-docx.
 
-def save_to_word(filtered_messages, output_file, username, search_method):
+    Each message clones the "Review #i" heading, "Message content:" label,
+    body and separator templates, fills in the date and body text and inserts
+    them directly before the section properties. This skips python-docx's
+    per-call style lookups and element construction, and its insertion
+    point search, which grows with the document.
+    """
+
+    def __init__(self, username):
+        self.document = Document()
+        self.document.add_heading(f"Reviews by {username}", level=1)
+        self._body = self.document.element.body
+        self._sect_pr = self._body.sectPr
+        self._heading = self._template(self.document.add_heading("Review", level=2))
+        self._label = self._template(self.document.add_paragraph("Message content:"))
+        self._content = self._template(self.document.add_paragraph("Content"))
+        self._separator = self._template(self.document.add_paragraph("-" * 40))
+
+    def _template(self, paragraph):
+        """Detach a freshly rendered paragraph so it can be cloned."""
+        element = paragraph._p
+        self._body.remove(element)
+        return element
+
+    def _filled(self, template, text):
+        """
+        Clone a single-run paragraph template with `text` as its run text,
+        dropping the characters XML cannot hold as `_run_xml` does.
+        """
+        p = copy.deepcopy(template)
+        r = p.r_lst[0]
+        if text:
+            r.text = _XML_INVALID_CHARS.sub("", text)
+        else:
+            # python-docx adds no run at all for empty text.
+            p.remove(r)
+        return p
+
+    def add_message(self, number, date, content):
+        """Append the heading, label, body and separator for one message."""
+        self._sect_pr.addprevious(self._filled(self._heading, f"Review #{number} - {date}"))
+        self._sect_pr.addprevious(copy.deepcopy(self._label))
+        self._sect_pr.addprevious(self._filled(self._content, content))
+        self._sect_pr.addprevious(copy.deepcopy(self._separator))
+
+    def save(self, output_file):
+        self.document.save(output_file)
+
+def save_to_word(filtered_messages, output_file, username, search_method, claimed=False):
     """
     Save filtered messages to a Word document.
     
     The document includes a header with the username and search criteria,
     and each message is separated by a heading that includes the formatted message date.
     """
-    doc = Document()
+    builder = FastDocumentBuilder(username)
     method_text = "First word search" if search_method == "first_word" else "Video game review search"
-    doc.add_heading(f"Reviews by {username}", level=1)
     
     for i, msg in enumerate(filtered_messages, start=1):
-        doc.add_heading(f"Review #{i} - {msg['date']}", level=2)
-        doc.add_paragraph("Message content:")
-        doc.add_paragraph(msg["content"])
-        doc.add_paragraph("-" * 40)
+        builder.add_message(i, msg["date"], msg["content"])
     
     # Ensure we don't overwrite an existing file.
-    final_output_file = get_available_filename(output_file)
-    doc.save(final_output_file)
+    with claim_output_file(output_file, claimed) as final_output_file:
+        builder.save(final_output_file)
     print(f"Document saved as {final_output_file}")
+    return final_output_file
 
-def main():
-    json_file = "skype_conversation.json"  # Update the path if necessary.
+# The blank document python-docx starts from; the streaming writer reuses its parts.
+DOCX_TEMPLATE = os.path.join(os.path.dirname(docx.__file__), "templates", "default.docx")
+DOCX_BODY_PART = "word/document.xml"
+
+# Tabs and line breaks become <w:tab/> and <w:br/> elements, as in python-docx.
+_RUN_SPECIAL_CHARS = re.compile(r'(\t|\r|\n)')
+_RUN_SPECIAL_XML = {"\t": "<w:tab/>", "\r": "<w:br/>", "\n": "<w:br/>"}
+
+def _run_xml(text):
+    """Return the <w:r> element python-docx builds for `text`."""
+    parts = ["<w:r>"]
+    for piece in _RUN_SPECIAL_CHARS.split(_XML_INVALID_CHARS.sub("", text)):
+        if piece in _RUN_SPECIAL_XML:
+            parts.append(_RUN_SPECIAL_XML[piece])
+        elif piece:
+            space = ' xml:space="preserve"' if len(piece.strip()) < len(piece) else ""
+            parts.append(f"<w:t{space}>{xml_escape(piece)}</w:t>")
+    parts.append("</w:r>")
+    return "".join(parts)
+
+class StreamingDocxWriter:
+    """
+    Write a Word document whose body is streamed into the zip as paragraphs
+    are added, so memory stays bounded however long the document gets.
+
+    The styles, settings and other parts are copied from python-docx's default
+    template, and paragraphs are rendered the same way python-docx renders
+    `add_paragraph` / `add_heading`, except that characters XML cannot hold
+    are dropped instead of raising. Call `close()` to finish the file.
+    """
+
+    FLUSH_SIZE = 1 << 16  # Characters buffered before writing to the zip.
+
+    def __init__(self, output_file):
+        self.template = zipfile.ZipFile(DOCX_TEMPLATE)
+        self.zip = zipfile.ZipFile(output_file, "w", zipfile.ZIP_DEFLATED)
+        names = self.template.namelist()
+        body_at = names.index(DOCX_BODY_PART)
+        for name in names[:body_at]:
+            self.zip.writestr(name, self.template.read(name))
+        self._remaining = names[body_at + 1:]
+
+        template_body = self.template.read(DOCX_BODY_PART).decode("utf-8")
+        body_start = template_body.index("<w:body>") + len("<w:body>")
+        self._footer = template_body[template_body.index("<w:sectPr"):]
+        self._part = self.zip.open(DOCX_BODY_PART, "w", force_zip64=True)
+        self._buffer = [template_body[:body_start]]
+        self._buffered = body_start
+
+    def _write(self, xml):
+        self._buffer.append(xml)
+        self._buffered += len(xml)
+        if self._buffered >= self.FLUSH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        self._part.write("".join(self._buffer).encode("utf-8"))
+        self._buffer = []
+        self._buffered = 0
+
+    def add_paragraph(self, text="", style=None):
+        """Append a paragraph, optionally with a paragraph style id such as "Heading2"."""
+        ppr = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ""
+        if not text:
+            self._write(f"<w:p>{ppr}</w:p>" if ppr else "<w:p/>")
+        else:
+            self._write(f"<w:p>{ppr}{_run_xml(text)}</w:p>")
+
+    def add_heading(self, text="", level=1):
+        """Append a heading paragraph, like python-docx's `add_heading` for levels 1-9."""
+        self.add_paragraph(text, f"Heading{level}")
+
+    def close(self):
+        """Finish the document body and write the remaining template parts."""
+        self._write(self._footer)
+        self._flush()
+        self._part.close()
+        for name in self._remaining:
+            self.zip.writestr(name, self.template.read(name))
+        self.zip.close()
+        self.template.close()
+
+def stream_to_word(filtered_messages, output_file, username, search_method, claimed=False):
+    """
+    Save filtered messages to a Word document with the same layout as
+    `save_to_word`, writing each message to disk as it arrives from the
+    (possibly lazy) `filtered_messages` iterable.
+    """
+    with claim_output_file(output_file, claimed) as final_output_file:
+        writer = StreamingDocxWriter(final_output_file)
+        try:
+            writer.add_heading(f"Reviews by {username}", level=1)
+            for i, msg in enumerate(filtered_messages, start=1):
+                writer.add_heading(f"Review #{i} - {msg['date']}", level=2)
+                writer.add_paragraph("Message content:")
+                writer.add_paragraph(msg["content"])
+                writer.add_paragraph("-" * 40)
+        finally:
+            writer.close()
+    print(f"Document saved as {final_output_file}")
+    return final_output_file
+
+TEXT_BUFFER_SIZE = 1 << 20  # Write buffer of the lightweight sinks.
+
+@contextlib.contextmanager
+def _open_text_sink(output_file, claimed=False, **kwargs):
+    """
+    Claim a free name for `output_file` (unless `claimed`, see `claim_output_file`)
+    and open it for buffered UTF-8 writing, yielding (file name, file).
+    The file is removed if the body raises.
+    """
+    with claim_output_file(output_file, claimed) as final_output_file:
+        with open(final_output_file, 'w', encoding='utf-8', buffering=TEXT_BUFFER_SIZE, **kwargs) as f:
+            yield final_output_file, f
+
+def save_to_text(filtered_messages, output_file, username, search_method, claimed=False):
+    """Save filtered messages to a plain-text file with the same layout as `save_to_word`."""
+    with _open_text_sink(output_file, claimed) as (final_output_file, f):
+        f.write(f"Reviews by {username}\n")
+        for i, msg in enumerate(filtered_messages, start=1):
+            f.write(f"\nReview #{i} - {msg['date']}\nMessage content:\n{msg['content']}\n{'-' * 40}\n")
+    print(f"Document saved as {final_output_file}")
+    return final_output_file
+
+def save_to_markdown(filtered_messages, output_file, username, search_method, claimed=False):
+    """Save filtered messages to a Markdown file with the same layout as `save_to_word`."""
+    with _open_text_sink(output_file, claimed) as (final_output_file, f):
+        f.write(f"# Reviews by {username}\n")
+        for i, msg in enumerate(filtered_messages, start=1):
+            f.write(f"\n## Review #{i} - {msg['date']}\n\nMessage content:\n\n{msg['content']}\n\n{'-' * 40}\n")
+    print(f"Document saved as {final_output_file}")
+    return final_output_file
+
+def save_to_csv(filtered_messages, output_file, username, search_method, claimed=False):
+    """
+    Save filtered messages to a CSV file with a header row and one row per
+    message: number, date, datetime (ISO 8601, empty if unknown) and content.
+    """
+    with _open_text_sink(output_file, claimed, newline='') as (final_output_file, f):
+        writer = csv.writer(f)
+        writer.writerow(["number", "date", "datetime", "content"])
+        writer.writerows((i, msg["date"], msg["datetime"].isoformat() if msg["datetime"] else "", msg["content"])
+                         for i, msg in enumerate(filtered_messages, start=1))
+    print(f"Document saved as {final_output_file}")
+    return final_output_file
+
+def save_to_jsonl(filtered_messages, output_file, username, search_method, claimed=False):
+    """
+    Save filtered messages as JSON Lines: one object per message with its
+    number, date, datetime (ISO 8601 or null) and content.
+    """
+    with _open_text_sink(output_file, claimed) as (final_output_file, f):
+        for i, msg in enumerate(filtered_messages, start=1):
+            record = {
+                "number": i,
+                "date": msg["date"],
+                "datetime": msg["datetime"].isoformat() if msg["datetime"] else None,
+                "content": msg["content"],
+            }
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write("\n")
+    print(f"Document saved as {final_output_file}")
+    return final_output_file
+
+def _period_label(msg, period):
+    """Return the "YYYY" or "YYYY-MM" label of a message's date, or "undated"."""
+    dt = msg["datetime"]
+    if dt is None:
+        return "undated"
+    return str(dt.year) if period == "year" else dt.strftime("%Y-%m")
+
+def split_messages(filtered_messages, max_messages=None, max_bytes=None, period=None):
+    """
+    Split formatted messages into consecutive parts, yielding (label, part)
+    pairs. A new part starts when the calendar `period` ("month" or "year")
+    changes, when a part holds `max_messages` messages, or when adding a
+    message would take its text (UTF-8 content and date) over `max_bytes`.
+    Every part holds at least one message.
+
+    Periods are split on change, so input that is not sorted by date may give
+    several parts for the same period.
+    """
+    def label():
+        if key is None:
+            return f"part{number:03d}"
+        return f"{key}_part{number:03d}" if max_messages or max_bytes else key
+
+    part, size, key, number = [], 0, None, 0
+    for msg in filtered_messages:
+        msg_key = _period_label(msg, period) if period else None
+        msg_size = len(msg["content"].encode("utf-8")) + len(msg["date"]) if max_bytes else 0
+        if part and msg_key != key:
+            yield label(), part
+            part, size, number = [], 0, 0
+        elif part and ((max_messages and len(part) >= max_messages)
+                       or (max_bytes and size + msg_size > max_bytes)):
+            yield label(), part
+            part, size = [], 0
+        if not part:
+            number += 1
+        key = msg_key
+        part.append(msg)
+        size += msg_size
+    if part:
+        yield label(), part
+
+def save_index_document(parts, output_file, username):
+    """
+    Save a document listing the parts of a split search, given (file name,
+    message count, first date, last date) tuples. It is a Word document when
+    `output_file` ends in ".docx" and a plain-text file otherwise.
+    """
+    lines = [f"{os.path.basename(file_name)}: {count} messages, {first_date} to {last_date}"
+             for file_name, count, first_date, last_date in parts]
+    intro = f"The results were split into {len(parts)} documents:"
+    if output_file.endswith(".docx"):
+        doc = Document()
+        doc.add_heading(f"Reviews by {username}", level=1)
+        doc.add_paragraph(intro)
+        for line in lines:
+            doc.add_paragraph(line)
+        with claim_output_file(output_file) as final_output_file:
+            doc.save(final_output_file)
+    else:
+        with _open_text_sink(output_file) as (final_output_file, f):
+            f.write("\n".join([f"Reviews by {username}", "", intro] + lines) + "\n")
+    print(f"Index document saved as {final_output_file}")
+    return final_output_file
+
+def render_documents(tasks, workers=1):
+    """
+    Render independent documents, on a pool of `workers` processes if more than one.
+
+    `tasks` yields (save, filtered_messages, output_file, username, search_method)
+    tuples, where `save` is one of the OUTPUT_FORMATS sinks and the messages are
+    a list. A free name is claimed for each document here, in task order (see
+    `get_available_filename`), and handed to the sink to overwrite, so the
+    names never depend on which worker finishes first. At most 2 * workers
+    documents are pending at a time. Returns the file names written, in task
+    order. If `tasks` or a sink raises, all the claimed files are removed.
+    """
+    names = []
     try:
-        data = load_conversation(json_file)
+        if workers <= 1:
+            for save, messages, output_file, username, search_method in tasks:
+                names.append(get_available_filename(output_file))
+                save(messages, names[-1], username, search_method, claimed=True)
+            return names
+
+        pending = collections.deque()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            try:
+                for save, messages, output_file, username, search_method in tasks:
+                    names.append(get_available_filename(output_file))
+                    pending.append(executor.submit(save, messages, names[-1], username, search_method,
+                                                   claimed=True))
+                    if len(pending) >= workers * 2:
+                        pending.popleft().result()
+                while pending:
+                    pending.popleft().result()
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+        return names
+    except BaseException:
+        for name in names:
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+        raise
+
+def save_split(filtered_messages, output_file, username, search_method, save=save_to_word,
+               max_messages=None, max_bytes=None, period=None, workers=1):
+    """
+    Save filtered messages as several documents (see `split_messages`) plus an
+    index document listing them.
+
+    The parts of "alice_messages.docx" are saved as "alice_messages_<label>.docx"
+    by `save`, rendered with `render_documents`. Returns the list of (file name,
+    message count, first date, last date) tuples written to the index.
+    """
+    base, ext = os.path.splitext(output_file)
+    summaries = []
+
+    def tasks():
+        for label, part in split_messages(filtered_messages, max_messages, max_bytes, period):
+            summaries.append((len(part), part[0]["date"], part[-1]["date"]))
+            yield save, part, f"{base}_{label}{ext}", username, search_method
+
+    names = render_documents(tasks(), workers)
+    parts = [(name, *summary) for name, summary in zip(names, summaries)]
+    if parts:
+        index_ext = ".docx" if ext == ".docx" else ".txt"
+        save_index_document(parts, f"{base}_index{index_ext}", username)
+    return parts
+
+def load_jobs(jobs_file):
+    """
+    Load batch jobs from a JSON file holding a list of objects with "username"
+    and optionally "search_method", "first_word", "conversation_id" and "output".
+    """
+    with open(jobs_file, 'r', encoding='utf-8') as f:
+        jobs = json.load(f)
+    if not isinstance(jobs, list):
+        raise ValueError("The jobs file must contain a JSON list of jobs.")
+    for job in jobs:
+        if not isinstance(job, dict) or not job.get("username"):
+            raise ValueError(f"Invalid job {job!r}: a username is required.")
+        if job.get("search_method", "first_word") not in SEARCH_METHODS:
+            raise ValueError(f"Invalid job {job!r}: unknown search method.")
+        if job.get("search_method") == "regex":
+            compile_patterns(first_word_set(job.get("first_word")))
+    return jobs
+
+def default_index_file(json_file):
+    """Return where the message index of `json_file` is kept."""
+    return os.path.splitext(json_file)[0] + ".index.sqlite"
+
+def open_current_index(json_file):
+    """Return the message index of `json_file` if it is up to date, else None."""
+    index_file = default_index_file(json_file)
+    if not os.path.exists(index_file):
+        return None
+    index = open_index(index_file)
+    if not index.is_current(json_file):
+        index.close()
+        return None
+    print(f"Using message index {index_file}")
+    return index
+
+def parse_date_range(since, until):
+    """
+    Turn optional 'YYYY-MM-DD' strings into the [since, until) datetimes used
+    by the filter. The last date is inclusive, so `until` becomes the start of
+    the following day. Raises ValueError for malformed dates.
+    """
+    since = datetime.strptime(since, "%Y-%m-%d") if since else None
+    until = datetime.strptime(until, "%Y-%m-%d") + timedelta(days=1) if until else None
+    return since, until
+
+def run_batch(json_file, jobs_file, workers=1, output_format="docx", use_mmap=False):
+    """
+    Run every job of `jobs_file` without prompting, scanning the export once
+    (or querying its message index if an up-to-date one exists) and saving one
+    document per job in `output_format`, rendered on `workers` processes.
+    use_mmap=True reads the export through a memory map.
+    """
+    try:
+        jobs = load_jobs(jobs_file)
+    except Exception as e:
+        print(f"Error reading jobs file: {e}")
+        return
+
+    try:
+        data = open_current_index(json_file) or load_conversation(json_file, stream=True, use_mmap=use_mmap,
+                                                                  project=True)
+        stats = [collections.Counter() for _ in jobs]
+        results = filter_messages_batch(data, jobs, stats)
     except Exception as e:
         print(f"Error reading JSON file: {e}")
         return
 
+    save, extension = OUTPUT_FORMATS[output_format]
+    tasks = []
+    for job, filtered_messages, job_stats in zip(jobs, results, stats):
+        username = job["username"]
+        if job.get("search_method") == "regex":
+            print(f"Search timed out for {username} on (counted as not matching): {job_stats['timeout']}")
+        if not filtered_messages:
+            print(f"No messages matched the criteria for {username}.")
+            continue
+        output_file = job.get("output") or f"{username}_messages{extension}"
+        tasks.append((save, filtered_messages, output_file, username, job.get("search_method", "first_word")))
+    render_documents(tasks, workers)
+
+# Output format name -> (sink function, file extension). Every sink takes
+# (filtered_messages, output_file, username, search_method, claimed=False)
+# and returns the name of the file it wrote; with claimed=True it overwrites
+# `output_file`, already claimed by the caller, instead of claiming a name.
+OUTPUT_FORMATS = {
+    "docx": (save_to_word, ".docx"),
+    "docx-stream": (stream_to_word, ".docx"),
+    "txt": (save_to_text, ".txt"),
+    "md": (save_to_markdown, ".md"),
+    "csv": (save_to_csv, ".csv"),
+    "jsonl": (save_to_jsonl, ".jsonl"),
+}
+
+def run_search(data, username, first_word, conversation_id, search_method,
+               since=None, until=None, workers=1, output_file=None, output_format="docx", sort=True,
+               split=None, state_file=None):
+    """
+    Filter `data`, report the stage counters and save the matches to
+    `output_file` (by default "<username>_messages.<ext>") in `output_format`.
+    With sort=False the matches keep export order and are handed to the sink
+    as they are found. `split` optionally holds the max_messages, max_bytes
+    and/or period arguments of `save_split`, to write several documents.
+    With a `state_file`, only messages added since the last run with that file
+    are filtered (see `filter_messages_incremental`) and the merged, sorted
+    results are saved.
+    """
+    save, extension = OUTPUT_FORMATS[output_format]
+    stats = collections.Counter()
+    if state_file:
+        try:
+            filtered_messages = iter(filter_messages_incremental(data, state_file, username, first_word,
+                                                                 conversation_id, search_method, workers,
+                                                                 since, until, stats))
+        except (OSError, ValueError) as e:
+            print(f"Error updating incremental state: {e}")
+            return
+    else:
+        filtered_messages = iter_filtered_messages(data, username, first_word, conversation_id, search_method,
+                                                   sort=sort, workers=workers, since=since, until=until,
+                                                   stats=stats)
+    try:
+        # With sort=True the sort stage drains the pipeline here, so streamed parse errors surface now.
+        first_message = next(filtered_messages, None)
+    except ExportReadError as e:
+        print(f"Error reading JSON file: {e}")
+        return
+    if first_message is None:
+        print_filter_stats(stats)
+        print("No messages matched the given criteria.")
+        return
+
+    if output_file is None:
+        output_file = f"{username}_messages{extension}"
+    filtered_messages = itertools.chain([first_message], filtered_messages)
+    try:
+        # Unsorted matches are read while saving, so streamed parse errors can surface here too;
+        # the sinks then remove what they wrote.
+        if split:
+            save_split(filtered_messages, output_file, username, search_method, save, workers=workers, **split)
+        else:
+            save(filtered_messages, output_file, username, search_method)
+    except ExportReadError as e:
+        print(f"Error reading JSON file: {e}")
+        return
+    print_filter_stats(stats)
+
+def run_review_stats(data, username=None, conversation_id=None, since=None, until=None, output_file=None):
+    """
+    Extract the review scores of `username` (of everyone if None) and save
+    their summary (see `ReviewScores.summary`) as JSON to `output_file`,
+    by default "<username>_review_stats.json".
+    """
+    stats = collections.Counter()
+    try:
+        reviews = extract_review_scores(data, username, conversation_id, since, until, stats)
+    except ValueError as e:
+        print(f"Error reading JSON file: {e}")
+        return
+    print_filter_stats(stats)
+    if not reviews:
+        print("No review scores found.")
+        return
+    if output_file is None:
+        output_file = f"{username or 'all'}_review_stats.json"
+    with _open_text_sink(output_file) as (final_output_file, f):
+        json.dump({"count": len(reviews), **reviews.summary()}, f, ensure_ascii=False, indent=2)
+    print(f"Review statistics saved as {final_output_file}")
+
+def interactive_main(json_file):
+    """Ask for the search criteria with input() prompts and run the search."""
+    data = open_current_index(json_file)
+    if data is None:
+        try:
+            if input("Build a message index for faster repeated searches? (y/N): ").strip().lower() == "y":
+                index_file = default_index_file(json_file)
+                build_index(json_file, index_file)
+                data = open_index(index_file)
+            else:
+                stream = input("Stream the JSON file instead of loading it all at once? (y/N): ").strip().lower() == "y"
+                data = load_conversation(json_file, stream=stream)
+        except Exception as e:
+            print(f"Error reading JSON file: {e}")
+            return
+
     username = input("Enter the username to search for: ").strip()
     conversation_id = input("Enter the conversation id to filter by (or press Enter to include all): ").strip()
     if not conversation_id:
@@ -141,25 +2033,174 @@ def main():
     print("Select search method:")
     print("1 - Filter by first word in the message")
     print("2 - Filter messages that appear to be video game reviews")
-    method_choice = input("Enter 1 or 2: ").strip()
+    print("3 - Filter messages containing any of a set of keywords")
+    print("4 - Filter messages matching a regular expression")
+    method_choice = input("Enter 1, 2, 3 or 4: ").strip()
     
     if method_choice == "1":
         search_method = "first_word"
-        first_word = input("Enter the first word to match: ").strip()
+        first_word = input("Enter the first word to match (separate several words with spaces): ").split()
     elif method_choice == "2":
         search_method = "review"
         first_word = None
+    elif method_choice == "3":
+        search_method = "keywords"
+        first_word = input("Enter the keywords to look for (separate several with commas): ").split(",")
+    elif method_choice == "4":
+        search_method = "regex"
+        first_word = input("Enter the regular expression: ")
+        try:
+            compile_patterns(first_word_set(first_word))
+        except ValueError as e:
+            print(e)
+            return
     else:
         print("Invalid selection.")
         return
 
-    filtered_messages = filter_messages(data, username, first_word, conversation_id, search_method)
-    if not filtered_messages:
-        print("No messages matched the given criteria.")
+    since = input("Enter the first date to include as YYYY-MM-DD (or press Enter for no limit): ").strip()
+    until = input("Enter the last date to include as YYYY-MM-DD (or press Enter for no limit): ").strip()
+    try:
+        since, until = parse_date_range(since, until)
+    except ValueError:
+        print("Invalid date.")
+        return
+
+    workers = input("Enter the number of worker processes (or press Enter for 1): ").strip()
+    try:
+        workers = int(workers) if workers else 1
+    except ValueError:
+        print("Invalid number of workers.")
+        return
+
+    run_search(data, username, first_word, conversation_id, search_method, since, until, workers)
+
+def parse_args(argv=None):
+    """Parse the command line. Without --username the interactive prompts are used."""
+    parser = argparse.ArgumentParser(
+        description="Filter messages from a Skype export and save them to a document. "
+                    "Run without --username to be asked for the search criteria.")
+    parser.add_argument("-i", "--input", default="skype_conversation.json",
+                        help="Skype export to read (default: %(default)s)")
+    parser.add_argument("-u", "--username", help="username whose messages are searched")
+    parser.add_argument("-c", "--conversation-id", help="only search this conversation")
+    parser.add_argument("-m", "--method", choices=list(SEARCH_METHODS), default="first_word",
+                        help="search method (default: %(default)s)")
+    parser.add_argument("-w", "--first-word", action="append",
+                        help="first word to match, keyword for the keywords method or pattern for "
+                             "the regex method; repeat to accept several")
+    parser.add_argument("--words-file", metavar="FILE",
+                        help="read more -w values from FILE, one per line (e.g. a list of game titles)")
+    parser.add_argument("--since", help="first date to include, as YYYY-MM-DD")
+    parser.add_argument("--until", help="last date to include, as YYYY-MM-DD")
+    parser.add_argument("-o", "--output", help="output file (default: <username>_messages.<extension>)")
+    parser.add_argument("-f", "--format", choices=list(OUTPUT_FORMATS), default="docx",
+                        help="output format; docx-stream writes the Word document incrementally "
+                             "(default: %(default)s)")
+    parser.add_argument("--split-count", type=int, metavar="N",
+                        help="split the output into documents of at most N messages")
+    parser.add_argument("--split-bytes", type=int, metavar="N",
+                        help="split the output into documents of about N bytes of message text")
+    parser.add_argument("--split-by", choices=["month", "year"],
+                        help="split the output into one document per calendar month or year")
+    parser.add_argument("--state", metavar="STATE_FILE",
+                        help="only filter messages added since the last run with this state file, "
+                             "and save them merged with that run's results")
+    parser.add_argument("--no-sort", action="store_true",
+                        help="keep export order instead of sorting by date, so matches are written as found")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="worker processes used for filtering (default: %(default)s)")
+    parser.add_argument("--stream", action="store_true",
+                        help="parse the export incrementally instead of loading it all at once")
+    parser.add_argument("--json-backend", choices=JSON_BACKENDS, default="auto",
+                        help="parser used to load the whole export; auto picks orjson when installed "
+                             "(default: %(default)s)")
+    parser.add_argument("--project", action="store_true",
+                        help="decode only the message fields the search reads, for faster and smaller loads")
+    parser.add_argument("--mmap", action="store_true",
+                        help="read the export through a memory map instead of regular file reads")
+    parser.add_argument("--no-index", action="store_true",
+                        help="ignore the message index even if it is up to date")
+    parser.add_argument("--build-index", action="store_true",
+                        help="build the message index for the export and exit")
+    parser.add_argument("--review-stats", action="store_true",
+                        help="save the count, mean and median review score per user and month and a score "
+                             "histogram as JSON (for every sender unless -u is given) and exit")
+    parser.add_argument("--batch", metavar="JOBS_FILE",
+                        help="run the jobs of a JSON jobs file in a single pass and exit")
+    args = parser.parse_args(argv)
+    if args.words_file:
+        try:
+            with open(args.words_file, 'r', encoding='utf-8') as f:
+                args.first_word = (args.first_word or []) + [line.strip() for line in f if line.strip()]
+        except OSError as e:
+            parser.error(f"cannot read --words-file: {e}")
+    searching = args.username is not None and not (args.build_index or args.batch or args.review_stats)
+    if searching and args.method != "review" and not first_word_set(args.first_word):
+        parser.error(f"--method {args.method} needs at least one -w/--first-word or --words-file term")
+    if args.method == "regex":
+        try:
+            compile_patterns(first_word_set(args.first_word))
+        except ValueError as e:
+            parser.error(str(e))
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if (args.split_count is not None and args.split_count < 1) or (args.split_bytes is not None and args.split_bytes < 1):
+        parser.error("--split-count and --split-bytes must be at least 1")
+    if args.state and args.no_sort:
+        parser.error("--state always sorts the merged results and cannot be combined with --no-sort")
+    if args.json_backend == "orjson" and orjson is None:
+        parser.error("--json-backend orjson needs the orjson package, which is not installed")
+    if args.json_backend == "orjson" and args.project:
+        parser.error("--json-backend orjson cannot be combined with --project; orjson cannot drop fields while decoding")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    json_file = args.input
+
+    if args.build_index:
+        try:
+            build_index(json_file, default_index_file(json_file), use_mmap=args.mmap)
+        except Exception as e:
+            print(f"Error reading JSON file: {e}")
+        return
+    if args.batch:
+        run_batch(json_file, args.batch, args.workers, args.format, use_mmap=args.mmap)
+        return
+    if args.username is None and not args.review_stats:
+        interactive_main(json_file)
+        return
+
+    try:
+        since, until = parse_date_range(args.since, args.until)
+    except ValueError:
+        print("Invalid date.")
+        return
+    if args.review_stats:
+        try:
+            data = load_conversation(json_file, stream=args.stream, use_mmap=args.mmap,
+                                     backend=args.json_backend, project=args.project)
+        except Exception as e:
+            print(f"Error reading JSON file: {e}")
+            return
+        run_review_stats(data, args.username, args.conversation_id, since, until, args.output)
+        return
+    try:
+        data = None if args.no_index or args.state else open_current_index(json_file)
+        if data is None:
+            data = load_conversation(json_file, stream=args.stream, use_mmap=args.mmap,
+                                     backend=args.json_backend, project=args.project)
+    except Exception as e:
+        print(f"Error reading JSON file: {e}")
         return
 
-    output_file = f"{username}_messages.docx"
-    save_to_word(filtered_messages, output_file, username, search_method)
+    split = None
+    if args.split_count or args.split_bytes or args.split_by:
+        split = {"max_messages": args.split_count, "max_bytes": args.split_bytes, "period": args.split_by}
+    run_search(data, args.username, args.first_word, args.conversation_id, args.method,
+               since, until, args.workers, args.output, args.format, sort=not args.no_sort, split=split,
+               state_file=args.state)
 
 if __name__ == "__main__":
     main()